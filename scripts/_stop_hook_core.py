@@ -0,0 +1,371 @@
+"""
+Transcript analysis shared by the Acutis stop hook.
+
+Determines whether the agent wrote security-relevant code that was not
+followed by a scan_code ALLOW. Kept separate from stop-hook.py so the
+analysis is importable (and its bytecode cached) on its own.
+"""
+
+import functools
+import hashlib
+import json
+import mmap
+import os
+import re
+
+try:
+    # Optional: several times faster than json for transcript lines
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+# ---------------------------------------------------------------------------
+# Constants
+# ---------------------------------------------------------------------------
+
+SECURITY_EXTENSIONS = frozenset({
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".php",
+    ".html", ".htm", ".mjs", ".cjs",
+})
+
+SKIP_PATTERNS = frozenset({
+    "node_modules", "__pycache__", ".git", "venv", ".venv",
+    "package-lock.json", "yarn.lock", "poetry.lock",
+})
+
+# stop-hook.sh reads its grep list from this line: keep it a single line of
+# double-quoted names
+WRITE_TOOLS = frozenset({"Write", "Edit", "write", "edit", "editFiles", "createFile"})
+
+# Substring match — plugin namespacing can prefix tool names
+# (e.g. "plugin:acutis:mcp__acutis__scan_code")
+SCAN_TOOL_KEYWORD = "scan_code"
+
+# Top-level entry types whose tool blocks sit at message.content
+_MESSAGE_TYPES = ("assistant", "user")
+
+# Nesting limit for the generic walk; real transcripts nest tool blocks at
+# most about four levels deep
+_MAX_DEPTH = 5
+
+# What a transcript entry contains, as bits: a security write, a scan ALLOW
+_FOUND_WRITE = 1
+_FOUND_ALLOW = 2
+_FOUND_BOTH = _FOUND_WRITE | _FOUND_ALLOW
+
+# A transcript line can only matter if it names a write tool (as a JSON
+# string) or carries an ALLOW; other lines are skipped without JSON parsing.
+# One alternation with the shared quote factored out is a single regex pass.
+_WRITE_NAME_RE = re.compile(
+    b'"(?:%s)"' % b"|".join(
+        re.escape(name.encode()) for name in sorted(WRITE_TOOLS, key=len, reverse=True)
+    )
+)
+_ALLOW_MARKER = b"ALLOW"
+
+# Bytes before the cached offset that must be unchanged for the cache to apply
+_FINGERPRINT_SIZE = 256
+
+
+@functools.lru_cache(maxsize=1024)
+def is_security_relevant(file_path: str) -> bool:
+    """Check if a file path is security-relevant based on extension.
+
+    Cached: the same few paths are typically written many times per session.
+    Uses plain string operations rather than pathlib on this hot path.
+    """
+    if os.altsep:
+        file_path = file_path.replace(os.altsep, os.sep)
+    parts = file_path.split(os.sep)
+    name = parts[-1]
+    # Same rule as Path.suffix: a leading dot (".env") is not an extension
+    i = name.rfind(".")
+    if i <= 0 or name[i:].lower() not in SECURITY_EXTENSIONS:
+        return False
+    if any(part in SKIP_PATTERNS for part in parts):
+        return False
+    return True
+
+
+def analyze_transcript(transcript_path: str) -> tuple[bool, bool]:
+    """Walk the transcript and determine verification state.
+
+    Returns (has_unverified_writes, has_security_writes):
+      - has_security_writes: any security-relevant file was written
+      - has_unverified_writes: last security write comes AFTER last scan_code ALLOW
+
+    The transcript is walked backwards from the end: only the most recent
+    write and the most recent ALLOW matter, so the walk stops as soon as
+    their ordering is known. Transcripts are append-only, so the result is
+    cached together with the byte offset it covers; later invocations only
+    walk the bytes appended since.
+    """
+    if not transcript_path or not os.path.isfile(transcript_path):
+        return False, False
+
+    cache_file = _cache_path(transcript_path)
+
+    try:
+        with open(transcript_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            buf = _map_transcript(f)
+    except (IOError, PermissionError):
+        return False, False
+
+    try:
+        cached = _load_cache(cache_file, buf, st)
+        if cached:
+            start = cached["offset"]
+            has_unverified = cached["has_unverified"]
+            has_writes = cached["has_writes"]
+        else:
+            start, has_unverified, has_writes = 0, False, False
+        end = len(buf)
+
+        # Whole-region substring search: if the new bytes name no write
+        # tool and carry no ALLOW, nothing needs parsing; otherwise lines
+        # are filtered only on the sentinels that actually occur.
+        match_writes, match_allow = _present_sentinels(buf, start, end)
+
+        # Bytes up to the last newline are complete; a partial trailing
+        # line is walked again next time.
+        nl = buf.rfind(b"\n", start, end)
+        offset = nl + 1 if nl >= 0 else start
+
+        if match_writes or match_allow:
+            lines = _iter_lines_reversed(buf, start, end)
+        else:
+            lines = ()
+
+        seen_allow = False
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if not (
+                (match_allow and _ALLOW_MARKER in line)
+                or (match_writes and _WRITE_NAME_RE.search(line))
+            ):
+                continue
+            try:
+                entry = loads(line)
+            except ValueError:
+                continue
+
+            found = _analyze_entry(entry)
+            if found & _FOUND_ALLOW and not seen_allow:
+                # Newest ALLOW: everything older is verified. From here
+                # on only a write matters, so stop matching on ALLOW.
+                has_unverified = False
+                seen_allow = True
+                match_allow = False
+            if found & _FOUND_WRITE:
+                # Ordering determined: this is the newest write, and a
+                # write in the same entry counts as before the ALLOW
+                if not seen_allow:
+                    has_unverified = True
+                has_writes = True
+                break
+            if seen_allow and has_writes:
+                # Verified, and the cache already knows of older writes
+                break
+
+        if cached is None or offset != start or (
+            has_unverified != cached["has_unverified"]
+            or has_writes != cached["has_writes"]
+        ):
+            _save_cache(cache_file, {
+                "dev": st.st_dev,
+                "ino": st.st_ino,
+                "offset": offset,
+                "fingerprint": _fingerprint(buf, offset),
+                "has_unverified": has_unverified,
+                "has_writes": has_writes,
+            })
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+    return has_unverified, has_writes
+
+
+def _map_transcript(f):
+    """Map the transcript read-only, or read it whole if it cannot be mapped.
+
+    Either way the result supports slicing, find/rfind and regex search, so
+    lines are taken straight from it with no chunk copies or text decoding.
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Empty files cannot be mapped
+        return f.read()
+
+
+def _iter_lines_reversed(buf, start: int, end: int):
+    """Yield the lines of buf[start:end] from last to first."""
+    pos = end
+    while True:
+        nl = buf.rfind(b"\n", start, pos)
+        if nl < 0:
+            yield buf[start:pos]
+            return
+        yield buf[nl + 1:pos]
+        pos = nl
+
+
+def _present_sentinels(buf, start: int, end: int) -> tuple[bool, bool]:
+    """Check buf[start:end] for (any write tool name, any ALLOW)."""
+    return (
+        _WRITE_NAME_RE.search(buf, start, end) is not None,
+        buf.find(_ALLOW_MARKER, start, end) >= 0,
+    )
+
+
+def _cache_path(transcript_path: str) -> str:
+    """Location of the offset cache for a transcript."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    key = hashlib.sha1(os.path.abspath(transcript_path).encode()).hexdigest()
+    return os.path.join(base, "acutis", "stop-hook", key + ".json")
+
+
+def _fingerprint(buf, offset: int) -> str:
+    """Hash of the bytes just before offset, to detect rewritten transcripts."""
+    return hashlib.sha1(buf[max(0, offset - _FINGERPRINT_SIZE):offset]).hexdigest()
+
+
+def _load_cache(cache_file: str, buf, st):
+    """Return the cached state for the open transcript, or None if stale."""
+    try:
+        with open(cache_file, "r") as cf:
+            cached = json.load(cf)
+        if (
+            cached["dev"] != st.st_dev
+            or cached["ino"] != st.st_ino
+            or not isinstance(cached["offset"], int)
+            or isinstance(cached["offset"], bool)
+            or not isinstance(cached["has_unverified"], bool)
+            or not isinstance(cached["has_writes"], bool)
+            or not 0 <= cached["offset"] <= len(buf)
+            or cached["fingerprint"] != _fingerprint(buf, cached["offset"])
+        ):
+            return None
+        return cached
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_cache(cache_file: str, state: dict) -> None:
+    """Persist the cache atomically; failures only cost a full walk next time."""
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp, "w") as cf:
+            json.dump(state, cf)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+
+
+def _analyze_entry(root) -> int:
+    """Check a transcript entry for security-relevant writes and scan ALLOWs.
+
+    Claude Code entries have a fixed shape,
+    {"type": "assistant" | "user", "message": {"content": [blocks]}},
+    so when content is a list its tool_use / tool_result blocks are checked
+    in one flat pass. Anything else goes through the generic walk.
+
+    Returns a combination of _FOUND_WRITE and _FOUND_ALLOW bits.
+    """
+    if isinstance(root, dict) and root.get("type") in _MESSAGE_TYPES:
+        message = root.get("message")
+        blocks = message.get("content") if isinstance(message, dict) else None
+        if isinstance(blocks, list):
+            found = 0
+            for block in blocks:
+                if isinstance(block, dict):
+                    found |= _check_tool_entry(block)
+                    if found == _FOUND_BOTH:
+                        break
+            return found
+
+    return _walk_entry(root)
+
+
+def _walk_entry(root) -> int:
+    """Generic fallback: search nested content/messages/message for tool entries.
+
+    Nested structures are walked with an explicit stack rather than
+    recursion, and the walk stops as soon as both bits are set.
+    """
+    found = 0
+    stack = [(root, 0)]
+
+    while stack:
+        entry, depth = stack.pop()
+        if depth > _MAX_DEPTH:
+            continue
+
+        if isinstance(entry, dict):
+            found |= _check_tool_entry(entry)
+            if found == _FOUND_BOTH:
+                break
+
+            # Descend into nested structures
+            for key in ("content", "messages", "message"):
+                val = entry.get(key)
+                if isinstance(val, (dict, list)):
+                    stack.append((val, depth + 1))
+
+        elif isinstance(entry, list):
+            stack.extend((item, depth + 1) for item in entry)
+
+    return found
+
+
+def _check_tool_entry(entry: dict) -> int:
+    """Check a single dict for a security write or a scan_code ALLOW.
+
+    Returns _FOUND_WRITE, _FOUND_ALLOW or 0.
+    """
+    # Claude Code uses name/input, Cursor tool_name/tool_input; take the
+    # first of the two that names a write or scan_code tool
+    for key in ("name", "tool_name"):
+        name = entry.get(key)
+        if isinstance(name, str) and (name in WRITE_TOOLS or SCAN_TOOL_KEYWORD in name):
+            break
+    else:
+        return 0
+
+    # Check for Write/Edit tool calls
+    if name in WRITE_TOOLS:
+        tool_input = entry.get("input") or entry.get("tool_input")
+        if not isinstance(tool_input, dict):
+            return 0
+        fp = tool_input.get("file_path") or tool_input.get("filePath")
+        if isinstance(fp, str) and is_security_relevant(fp):
+            return _FOUND_WRITE
+        return 0
+
+    # Check for scan_code results with ALLOW
+    # Use substring match: plugin namespacing prefixes tool names
+    if SCAN_TOOL_KEYWORD in name:
+        for key in ("content", "result", "tool_result"):
+            result = entry.get(key)
+            if isinstance(result, str):
+                if "ALLOW" in result:
+                    return _FOUND_ALLOW
+            elif isinstance(result, list):
+                for item in result:
+                    if isinstance(item, dict):
+                        text = item.get("text")
+                        if isinstance(text, str) and "ALLOW" in text:
+                            return _FOUND_ALLOW
+            elif isinstance(result, dict):
+                decision = result.get("decision")
+                if isinstance(decision, str) and "ALLOW" in decision:
+                    return _FOUND_ALLOW
+
+    return 0
@@ -40,4 +40,39 @@ if [ -n "$REPO_ROOT" ]; then
     done
 fi
 
-exec "$PYTHON" "$SCRIPT_DIR/stop-hook.py" "$@"
+# Fast path: settle the common "nothing to verify" cases without paying for
+# interpreter startup. Anything this cannot decide falls through to Python.
+HOOK_INPUT="$(cat)"
+
+# Loop guard (mirrors stop-hook.py)
+if [[ $HOOK_INPUT =~ \"stop_hook_active\"[[:space:]]*:[[:space:]]*true ]]; then
+    exit 0
+fi
+
+# Only plain paths (no JSON escapes) are taken from the raw input
+if [[ $HOOK_INPUT =~ \"transcript_path\"[[:space:]]*:[[:space:]]*\"([^\"\\]+)\" ]]; then
+    TRANSCRIPT="${BASH_REMATCH[1]}"
+    if [ ! -f "$TRANSCRIPT" ]; then
+        exit 0
+    fi
+
+    # Write tool names are taken from the single-line WRITE_TOOLS literal in
+    # _stop_hook_core.py. If that line is missing or spans several lines,
+    # the list stays empty and the decision is left to Python.
+    WRITE_TOOL_ARGS=()
+    TOOLS_LINE="$(grep -m1 -E '^WRITE_TOOLS = frozenset\(\{.*\}\)$' \
+        "$SCRIPT_DIR/_stop_hook_core.py" || true)"
+    while [[ $TOOLS_LINE =~ \"([^\"]+)\"(.*) ]]; do
+        WRITE_TOOL_ARGS+=(-e "\"${BASH_REMATCH[1]}\"")
+        TOOLS_LINE="${BASH_REMATCH[2]}"
+    done
+
+    # No write tool ever named in the transcript: no security-relevant
+    # writes, so allow the stop. Without the list, defer to Python.
+    if [ ${#WRITE_TOOL_ARGS[@]} -gt 0 ] \
+        && ! grep -qF "${WRITE_TOOL_ARGS[@]}" "$TRANSCRIPT"; then
+        exit 0
+    fi
+fi
+
+exec "$PYTHON" "$SCRIPT_DIR/stop-hook.py" "$@" <<<"$HOOK_INPUT"
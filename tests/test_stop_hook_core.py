@@ -0,0 +1,119 @@
+"""Tests for the stop hook's incremental transcript analysis and its cache."""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import _stop_hook_core as core  # noqa: E402
+
+WRITE = {
+    "type": "assistant",
+    "message": {"content": [
+        {"type": "tool_use", "name": "Write", "input": {"file_path": "app.py"}},
+    ]},
+}
+ALLOW = {
+    "type": "user",
+    "message": {"content": [
+        {"type": "tool_result", "name": "mcp__acutis__scan_code", "content": "ALLOW"},
+    ]},
+}
+CHAT = {"type": "user", "message": {"content": "x" * 1024}}
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def transcript(tmp_path):
+    return tmp_path / "transcript.jsonl"
+
+
+def append(path, *entries):
+    with open(path, "a") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+def read_cache(path):
+    with open(core._cache_path(str(path))) as f:
+        return json.load(f)
+
+
+def test_write_allow_write_across_calls(transcript):
+    append(transcript, CHAT, WRITE)
+    assert core.analyze_transcript(str(transcript)) == (True, True)
+    assert read_cache(transcript)["offset"] == transcript.stat().st_size
+
+    append(transcript, ALLOW)
+    assert core.analyze_transcript(str(transcript)) == (False, True)
+
+    append(transcript, CHAT)
+    assert core.analyze_transcript(str(transcript)) == (False, True)
+
+    append(transcript, WRITE)
+    assert core.analyze_transcript(str(transcript)) == (True, True)
+    assert read_cache(transcript)["offset"] == transcript.stat().st_size
+
+
+def test_line_split_across_appends(transcript):
+    append(transcript, ALLOW)
+    line = json.dumps(WRITE) + "\n"
+    half = len(line) // 2
+
+    with open(transcript, "a") as f:
+        f.write(line[:half])
+    assert core.analyze_transcript(str(transcript)) == (False, False)
+    # The partial line is not counted as consumed
+    assert read_cache(transcript)["offset"] == len(json.dumps(ALLOW)) + 1
+
+    with open(transcript, "a") as f:
+        f.write(line[half:])
+    assert core.analyze_transcript(str(transcript)) == (True, True)
+
+
+def test_same_inode_rewrite_invalidates_cache(transcript):
+    append(transcript, WRITE)
+    assert core.analyze_transcript(str(transcript)) == (True, True)
+    inode = transcript.stat().st_ino
+
+    # Rewrite in place with longer content so the cached offset still fits
+    with open(transcript, "r+") as f:
+        f.truncate(0)
+        f.write(json.dumps(CHAT) + "\n")
+    assert transcript.stat().st_ino == inode
+    assert transcript.stat().st_size > read_cache(transcript)["offset"]
+
+    assert core.analyze_transcript(str(transcript)) == (False, False)
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda state: "{not json",
+    lambda state: json.dumps([1, 2]),
+    lambda state: json.dumps({k: v for k, v in state.items() if k != "has_writes"}),
+    lambda state: json.dumps({**state, "has_unverified": "yes"}),
+    lambda state: json.dumps({**state, "offset": 1.5}),
+])
+def test_corrupt_cache_is_ignored_and_replaced(transcript, corrupt):
+    append(transcript, WRITE)
+    assert core.analyze_transcript(str(transcript)) == (True, True)
+
+    cache_file = core._cache_path(str(transcript))
+    state = read_cache(transcript)
+    with open(cache_file, "w") as f:
+        f.write(corrupt(state))
+
+    assert core.analyze_transcript(str(transcript)) == (True, True)
+    assert read_cache(transcript) == state
+
+
+def test_missing_transcript(tmp_path):
+    assert core.analyze_transcript(str(tmp_path / "missing.jsonl")) == (False, False)
+    assert not os.path.exists(tmp_path / "cache")